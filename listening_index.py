@@ -0,0 +1,485 @@
+import os
+import sys
+import struct
+import zlib
+import time
+import argparse
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+# On-disk format (see ListeningIndex.save): magic, version and section sizes,
+# then the zlib-compressed string table, then one postings section each for
+# hosts, ports and processes. A section is a compressed directory of
+# (key, offset, length) uint32 arrays followed by individually compressed
+# posting lists, so a query only reads and inflates the lists it needs.
+# Port and process lists hold sorted host IDs and are delta-encoded.
+MAGIC = b'VLPI'
+VERSION = 2
+SECTIONS = ('hosts', 'ports', 'processes')
+HEADER = struct.Struct('<4sIII' + 'III' * len(SECTIONS))
+MAX_PORT = 65535
+
+
+def parse_metadata(metadata):
+    """Parse a vm_listening_process_metadata string into (process, port) pairs.
+
+    The string is the ';'-joined 'process:port' output of bash9.sh or pws1.ps1.
+    Entries without a usable port are skipped; the process name may be empty
+    when ss could not resolve the owning process.
+    """
+    listeners = set()
+    for entry in metadata.strip().split(';'):
+        entry = entry.strip()
+        if not entry:
+            continue
+        process, _, port = entry.rpartition(':')
+        try:
+            port = int(port)
+        except ValueError:
+            continue
+        if 0 <= port <= MAX_PORT:
+            listeners.add((process.strip(), port))
+    return listeners
+
+
+def read_metadata_file(file_path):
+    """Yield (host, metadata) pairs from a collected metadata file.
+
+    Each line is either '<host>\\t<metadata>' or a bare metadata string, in
+    which case the file name (without extension) is the host. Empty metadata
+    (a '<host>\\t' line, or a file with no content lines) means the host has
+    no listeners. Only one bare line per file is meaningful; later ones
+    replace earlier ones, so a warning is printed for each repeat.
+    """
+    default_host = os.path.splitext(os.path.basename(file_path))[0]
+    bare_lines = 0
+    entries = 0
+    with open(file_path, encoding='utf-8', errors='replace') as f:
+        for line_number, line in enumerate(f, 1):
+            # Only the line ending is stripped so a trailing tab still marks a host
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            entries += 1
+            host, tab, metadata = line.partition('\t')
+            if tab and host.strip():
+                yield host.strip(), metadata
+                continue
+            bare_lines += 1
+            if bare_lines > 1:
+                print(f"Warning: {file_path}:{line_number} replaces earlier metadata for host '{default_host}'",
+                      file=sys.stderr)
+            yield default_host, line.strip()
+    if not entries:
+        yield default_host, ''
+
+
+def _to_bytes(values):
+    values = array('I', values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(data, source):
+    if len(data) % 4:
+        raise ValueError(f"Corrupt uint32 array in {source}")
+    values = array('I')
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def _inflate(data, source):
+    try:
+        return zlib.decompress(data)
+    except zlib.error as e:
+        raise ValueError(f"Corrupt compressed data in {source}: {e}") from None
+
+
+def _delta_encode(values):
+    return [b - a for a, b in zip([0] + values, values)]
+
+
+def _pack_section(postings):
+    """Serialise {key: uint32 list} into (count, directory bytes, blob bytes)."""
+    keys = sorted(postings)
+    offsets = array('I')
+    lengths = array('I')
+    chunks = []
+    position = 0
+    for key in keys:
+        chunk = zlib.compress(_to_bytes(postings[key]))
+        offsets.append(position)
+        lengths.append(len(chunk))
+        chunks.append(chunk)
+        position += len(chunk)
+    directory = array('I', keys) + offsets + lengths
+    return len(keys), zlib.compress(_to_bytes(directory)), b''.join(chunks)
+
+
+class IndexFile:
+    """Read-only view of a saved index that reads only what a query needs.
+
+    Opening reads the fixed header; the string table, section directories
+    and posting lists are loaded lazily and validated as they are read.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+        self._strings = None
+        self._ids = None
+        self._directories = {}
+        try:
+            self._read_header()
+        except Exception:
+            self._file.close()
+            raise
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _read(self, offset, size):
+        self._file.seek(offset)
+        data = self._file.read(size)
+        if len(data) != size:
+            raise ValueError(f"{self.file_path} is truncated")
+        return data
+
+    def _read_header(self):
+        header = self._file.read(HEADER.size)
+        if len(header) < 4 or header[:4] != MAGIC:
+            raise ValueError(f"{self.file_path} is not a listening index file")
+        if len(header) != HEADER.size:
+            raise ValueError(f"{self.file_path} is truncated")
+        magic, version, self._string_count, strings_size, *sizes = HEADER.unpack(header)
+        if version != VERSION:
+            raise ValueError(f"Unsupported index version {version} in {self.file_path}")
+
+        offset = HEADER.size
+        self._strings_span = (offset, strings_size)
+        offset += strings_size
+        self._sections = {}
+        for i, name in enumerate(SECTIONS):
+            count, directory_size, blob_size = sizes[3 * i:3 * i + 3]
+            self._sections[name] = (count, offset, directory_size, offset + directory_size, blob_size)
+            offset += directory_size + blob_size
+        if os.fstat(self._file.fileno()).st_size < offset:
+            raise ValueError(f"{self.file_path} is truncated")
+
+    @property
+    def strings(self):
+        """The interned string table, indexed by string ID."""
+        if self._strings is None:
+            data = _inflate(self._read(*self._strings_span), self.file_path)
+            strings = data.decode('utf-8', errors='replace').split('\0') if self._string_count else []
+            if len(strings) != self._string_count:
+                raise ValueError(f"Corrupt string table in {self.file_path}")
+            self._strings = strings
+        return self._strings
+
+    def _name(self, string_id):
+        if string_id >= self._string_count:
+            raise ValueError(f"String ID {string_id} out of range in {self.file_path}")
+        return self.strings[string_id]
+
+    def _string_id(self, value):
+        if self._ids is None:
+            self._ids = {string: i for i, string in enumerate(self.strings)}
+        return self._ids.get(value)
+
+    def _directory(self, name):
+        directory = self._directories.get(name)
+        if directory is None:
+            count, directory_offset, directory_size, _, blob_size = self._sections[name]
+            values = _from_bytes(_inflate(self._read(directory_offset, directory_size), self.file_path),
+                                 self.file_path)
+            if len(values) != 3 * count:
+                raise ValueError(f"Corrupt {name} directory in {self.file_path}")
+            keys, offsets, lengths = values[:count], values[count:2 * count], values[2 * count:]
+            for offset, length in zip(offsets, lengths):
+                if offset + length > blob_size:
+                    raise ValueError(f"Corrupt {name} directory in {self.file_path}")
+            directory = self._directories[name] = (keys, offsets, lengths)
+        return directory
+
+    def _host_ids(self, name, key):
+        """Return the delta-decoded host IDs stored under key in a section."""
+        return accumulate(self._postings(name, key))
+
+    def _postings(self, name, key):
+        """Return the posting list stored under key in a section, or an empty array."""
+        if key is None:
+            return array('I')
+        keys, offsets, lengths = self._directory(name)
+        i = bisect_left(keys, key)
+        if i == len(keys) or keys[i] != key:
+            return array('I')
+        blob_offset = self._sections[name][3]
+        data = self._read(blob_offset + offsets[i], lengths[i])
+        return _from_bytes(_inflate(data, self.file_path), self.file_path)
+
+    def _pairs(self, values):
+        """Split a host's flat listener list into validated (process ID, port) pairs."""
+        if len(values) % 2:
+            raise ValueError(f"Corrupt host listeners in {self.file_path}")
+        pairs = list(zip(values[0::2], values[1::2]))
+        for process_id, port in pairs:
+            if process_id >= self._string_count or port > MAX_PORT:
+                raise ValueError(f"Corrupt host listeners in {self.file_path}")
+        return pairs
+
+    def host_records(self):
+        """Yield (host ID, [(process ID, port), ...]) for every indexed host."""
+        keys, offsets, lengths = self._directory('hosts')
+        _, _, _, blob_offset, blob_size = self._sections['hosts']
+        blob = self._read(blob_offset, blob_size)
+        for host_id, offset, length in zip(keys, offsets, lengths):
+            if host_id >= self._string_count:
+                raise ValueError(f"String ID {host_id} out of range in {self.file_path}")
+            values = _from_bytes(_inflate(blob[offset:offset + length], self.file_path), self.file_path)
+            yield host_id, self._pairs(values)
+
+    def hosts_for_port(self, port):
+        """Return the sorted hosts listening on a port."""
+        return sorted(self._name(h) for h in self._host_ids('ports', port))
+
+    def hosts_for_process(self, process):
+        """Return the sorted hosts running a listening process (exact name)."""
+        return sorted(self._name(h) for h in self._host_ids('processes', self._string_id(process)))
+
+    def listeners_for_host(self, host):
+        """Return the sorted (process, port) listeners of a host."""
+        pairs = self._pairs(self._postings('hosts', self._string_id(host)))
+        return sorted((self._name(p), port) for p, port in pairs)
+
+
+class ListeningIndex:
+    """Inverted indexes over listening process metadata for many hosts.
+
+    Host and process names are interned to integer IDs; the indexes map
+    port -> host IDs, process ID -> host IDs and host ID -> (process ID, port).
+    """
+
+    def __init__(self):
+        self._strings = []
+        self._ids = {}
+        self.host_listeners = {}
+        self.port_hosts = {}
+        self.process_hosts = {}
+
+    def _intern(self, value):
+        """Return the integer ID for a string, allocating one if needed."""
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            self._ids[value] = string_id
+        return string_id
+
+    def _name(self, string_id):
+        return self._strings[string_id]
+
+    def _unlink(self, host_id):
+        """Remove a host's listeners from the port and process indexes."""
+        for process_id, port in self.host_listeners.pop(host_id, ()):
+            hosts = self.port_hosts.get(port)
+            if hosts is not None:
+                hosts.discard(host_id)
+                if not hosts:
+                    del self.port_hosts[port]
+            hosts = self.process_hosts.get(process_id)
+            if hosts is not None:
+                hosts.discard(host_id)
+                if not hosts:
+                    del self.process_hosts[process_id]
+
+    def _link(self, host_id, listeners):
+        self.host_listeners[host_id] = listeners
+        for process_id, port in listeners:
+            self.port_hosts.setdefault(port, set()).add(host_id)
+            self.process_hosts.setdefault(process_id, set()).add(host_id)
+
+    def add_host(self, host, metadata):
+        """Index a host's metadata string, replacing any previous entry for it."""
+        host_id = self._intern(host)
+        listeners = {(self._intern(process), port) for process, port in parse_metadata(metadata)}
+        if self.host_listeners.get(host_id) == listeners:
+            return
+        self._unlink(host_id)
+        self._link(host_id, listeners)
+
+    def remove_host(self, host):
+        """Drop a host from the index. Returns False if it was not indexed."""
+        host_id = self._ids.get(host)
+        if host_id is None or host_id not in self.host_listeners:
+            return False
+        self._unlink(host_id)
+        return True
+
+    def ingest_file(self, file_path):
+        """Index every (host, metadata) pair in a file. Returns the line count."""
+        count = 0
+        for host, metadata in read_metadata_file(file_path):
+            self.add_host(host, metadata)
+            count += 1
+        return count
+
+    def hosts_for_port(self, port):
+        """Return the sorted hosts listening on a port."""
+        return sorted(self._name(h) for h in self.port_hosts.get(port, ()))
+
+    def hosts_for_process(self, process):
+        """Return the sorted hosts running a listening process (exact name)."""
+        process_id = self._ids.get(process)
+        if process_id is None:
+            return []
+        return sorted(self._name(h) for h in self.process_hosts.get(process_id, ()))
+
+    def listeners_for_host(self, host):
+        """Return the sorted (process, port) listeners of a host."""
+        host_id = self._ids.get(host)
+        if host_id is None:
+            return []
+        return sorted((self._name(p), port) for p, port in self.host_listeners.get(host_id, ()))
+
+    def __len__(self):
+        return len(self.host_listeners)
+
+    def save(self, file_path):
+        """Write the index to a compact binary file readable by IndexFile.
+
+        Only strings still referenced are written, so IDs are compacted on
+        save. Each host, port and process gets its own compressed posting
+        list: (process ID, port) pairs for hosts, delta-encoded sorted host
+        IDs for ports and processes.
+        """
+        remap = {}
+        strings = []
+
+        def compact(string_id):
+            new_id = remap.get(string_id)
+            if new_id is None:
+                new_id = remap[string_id] = len(strings)
+                strings.append(self._strings[string_id])
+            return new_id
+
+        hosts = {}
+        for host_id in sorted(self.host_listeners, key=self._name):
+            flat = []
+            for process_id, port in sorted(self.host_listeners[host_id]):
+                flat.append(compact(process_id))
+                flat.append(port)
+            hosts[compact(host_id)] = flat
+        ports = {port: _delta_encode(sorted(remap[h] for h in host_ids))
+                 for port, host_ids in self.port_hosts.items()}
+        processes = {remap[p]: _delta_encode(sorted(remap[h] for h in host_ids))
+                     for p, host_ids in self.process_hosts.items()}
+
+        table = zlib.compress('\0'.join(strings).encode('utf-8'))
+        sections = [_pack_section(postings) for postings in (hosts, ports, processes)]
+        sizes = []
+        for count, directory, blob in sections:
+            sizes.extend((count, len(directory), len(blob)))
+
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(strings), len(table), *sizes))
+            f.write(table)
+            for _, directory, blob in sections:
+                f.write(directory)
+                f.write(blob)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        """Read a whole index previously written by save(), for updating it."""
+        index = cls()
+        with IndexFile(file_path) as reader:
+            index._strings = list(reader.strings)
+            index._ids = {value: i for i, value in enumerate(index._strings)}
+            for host_id, pairs in reader.host_records():
+                index._link(host_id, set(pairs))
+        return index
+
+
+def _load_or_exit(parser, file_path):
+    """Load an index for updating, reporting a missing or corrupt file as a usage error."""
+    try:
+        return ListeningIndex.load(file_path)
+    except (OSError, ValueError) as e:
+        parser.error(f"Cannot read index: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index and query collected vm_listening_process_metadata strings.")
+    parser.add_argument('--index', required=True, help="Path of the on-disk index file")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help="Add or update hosts from metadata files")
+    ingest.add_argument('files', nargs='+', help="Files of '<host>\\t<metadata>' lines or one bare metadata line")
+    ingest.add_argument('--rebuild', action='store_true', help="Start from an empty index instead of updating")
+
+    remove = subparsers.add_parser('remove', help="Remove hosts from the index")
+    remove.add_argument('hosts', nargs='+')
+
+    query = subparsers.add_parser('query', help="Query the index")
+    group = query.add_mutually_exclusive_group(required=True)
+    group.add_argument('--port', type=int, help="Hosts listening on this port")
+    group.add_argument('--process', help="Hosts running this listening process")
+    group.add_argument('--host', help="Listeners of this host")
+
+    args = parser.parse_args()
+
+    if args.command == 'ingest':
+        start = time.perf_counter()
+        if args.rebuild or not os.path.exists(args.index):
+            index = ListeningIndex()
+        else:
+            index = _load_or_exit(parser, args.index)
+        lines = 0
+        for file_path in args.files:
+            try:
+                lines += index.ingest_file(file_path)
+            except OSError as e:
+                print(f"Error reading {file_path}: {e}", file=sys.stderr)
+        index.save(args.index)
+        print(f"Ingested {lines} entries in {time.perf_counter() - start:.3f}s; {len(index)} hosts indexed")
+        return
+
+    if args.command == 'remove':
+        index = _load_or_exit(parser, args.index)
+        removed = sum(index.remove_host(host) for host in args.hosts)
+        index.save(args.index)
+        print(f"Removed {removed} hosts; {len(index)} hosts indexed")
+        return
+
+    # Timed from opening the file, so the figure covers everything the query reads
+    start = time.perf_counter()
+    try:
+        with IndexFile(args.index) as reader:
+            if args.port is not None:
+                results = reader.hosts_for_port(args.port)
+            elif args.process is not None:
+                results = reader.hosts_for_process(args.process)
+            else:
+                results = [f"{process}:{port}" for process, port in reader.listeners_for_host(args.host)]
+    except (OSError, ValueError) as e:
+        parser.error(f"Cannot read index: {e}")
+    elapsed = time.perf_counter() - start
+    for result in results:
+        print(result)
+    print(f"{len(results)} results in {elapsed * 1000:.3f}ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
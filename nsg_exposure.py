@@ -0,0 +1,384 @@
+import sys
+import csv
+import json
+import argparse
+from collections import namedtuple
+
+# Columns projected by the Resource Graph query in azure_rg_vm_nsg.py
+COLUMNS = [
+    'vmName', 'resourceGroup', 'location',
+    'nicNsgPorts', 'nicNsgProtocol', 'nicNsgSource',
+    'subnetNsgPorts', 'subnetNsgProtocol', 'subnetNsgSource',
+]
+
+MAX_PORT = 65535
+
+# Protocols whose rules carry destination ports. Icmp, Esp and Ah rules use
+# '*' as their port range, so they never count towards port coverage.
+PORT_PROTOCOLS = ('Tcp', 'Udp')
+
+Rule = namedtuple('Rule', ['start', 'end', 'protocol', 'source'])
+Nic = namedtuple('Nic', ['nic_id', 'vm_id', 'nsg_id', 'subnet_nsg_id'])
+
+
+class IntervalIndex:
+    """Static interval index over closed (start, end) integer ranges.
+
+    Intervals are sorted by start and laid out as an implicit balanced tree
+    (the middle element of each slice is its root) with the maximum end of
+    every subtree precomputed, so stabbing and overlap queries only visit
+    subtrees that can contain a match.
+    """
+
+    def __init__(self, intervals):
+        self._items = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self._max_end = [0] * len(self._items)
+        self._build(0, len(self._items))
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return -1
+        mid = (lo + hi) // 2
+        max_end = max(self._items[mid][1], self._build(lo, mid), self._build(mid + 1, hi))
+        self._max_end[mid] = max_end
+        return max_end
+
+    def overlapping(self, start, end=None):
+        """Return the values of all intervals overlapping [start, end]."""
+        if end is None:
+            end = start
+        results = []
+        stack = [(0, len(self._items))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_end[mid] < start:
+                continue
+            item_start, item_end, value = self._items[mid]
+            stack.append((lo, mid))
+            if item_start <= end:
+                if item_end >= start:
+                    results.append(value)
+                stack.append((mid + 1, hi))
+        return results
+
+    def __len__(self):
+        return len(self._items)
+
+
+def load_resources(file_paths):
+    """Load exported Resources rows from one or more JSON files.
+
+    Accepts a plain JSON array, or the objects written by `az graph query`
+    ({"data": [...]}) and the REST API ({"value": [...]}).
+    """
+    resources = []
+    for file_path in file_paths:
+        with open(file_path, encoding='utf-8-sig') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get('data', data.get('value', []))
+        if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+            raise ValueError(f"{file_path} does not hold a list of resources")
+        resources.extend(data)
+    return resources
+
+
+def _lower(value):
+    return value.lower() if isinstance(value, str) else ''
+
+
+def _get(obj, *keys):
+    """Walk nested dicts/lists, returning None when any step is missing."""
+    for key in keys:
+        if isinstance(obj, dict):
+            obj = obj.get(key)
+        elif isinstance(obj, list) and isinstance(key, int) and -len(obj) <= key < len(obj):
+            obj = obj[key]
+        else:
+            return None
+    return obj
+
+
+def parse_port_range(value):
+    """Parse '80', '1000-2000' or '*' into a (start, end) tuple, or None."""
+    value = str(value).strip()
+    if value == '*':
+        return 0, MAX_PORT
+    start, _, end = value.partition('-')
+    try:
+        start = int(start)
+        end = int(end) if end else start
+    except ValueError:
+        return None
+    if start > end:
+        start, end = end, start
+    if start < 0 or end > MAX_PORT:
+        return None
+    return start, end
+
+
+def inbound_allow_rules(nsg):
+    """Expand an NSG's inbound Allow rules into one Rule per port range."""
+    rules = []
+    for rule in _get(nsg, 'properties', 'securityRules') or []:
+        props = rule.get('properties') or {}
+        if _lower(props.get('direction')) != 'inbound' or _lower(props.get('access')) != 'allow':
+            continue
+        port_ranges = props.get('destinationPortRanges') or [props.get('destinationPortRange')]
+        source = props.get('sourceAddressPrefix')
+        if not source and props.get('sourceAddressPrefixes'):
+            source = ','.join(props['sourceAddressPrefixes'])
+        for port_range in port_ranges:
+            if port_range is None:
+                continue
+            parsed = parse_port_range(port_range)
+            if parsed is not None:
+                rules.append(Rule(parsed[0], parsed[1], props.get('protocol'), source))
+    return rules
+
+
+def format_ports(rule):
+    if rule is None:
+        return ''
+    return str(rule.start) if rule.start == rule.end else f"{rule.start}-{rule.end}"
+
+
+def merge_ranges(ranges):
+    """Merge overlapping or adjacent (start, end) ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _protocol_matches(rule, protocol):
+    return rule.protocol in (None, '*') or _lower(rule.protocol) == protocol.lower()
+
+
+def _port_protocols(protocol):
+    """Return the port-carrying protocols to check for a requested protocol."""
+    if protocol is None:
+        return PORT_PROTOCOLS
+    return [checked for checked in PORT_PROTOCOLS if checked.lower() == protocol.lower()]
+
+
+class NsgExposure:
+    """Inbound NSG allow-rule coverage of VMs computed from exported Resources rows.
+
+    Mirrors the joins in azure_rg_vm_nsg.py: VM -> NICs (first IP
+    configuration's subnet) -> NIC NSG and subnet NSG inbound Allow rules.
+    Each NSG rule's port range is stored once in a tenant-wide IntervalIndex
+    and once in its NSG's own IntervalIndex, however many NICs share the NSG;
+    NICs are resolved through an NSG -> NICs map after the lookup.
+
+    Like the query, only Allow rules are considered: Deny rules, rule
+    priorities and source prefixes are not evaluated, so results describe
+    what the Allow rules cover rather than the effective security rules.
+    """
+
+    def __init__(self, resources):
+        self.vms = {}
+        self.nics = []
+        self.nsg_rules = {}
+        subnet_nsgs = {}
+        nic_rows = []
+
+        for resource in resources:
+            resource_type = _lower(resource.get('type'))
+            if resource_type == 'microsoft.compute/virtualmachines':
+                self.vms[_lower(resource.get('id'))] = resource
+            elif resource_type == 'microsoft.network/networkinterfaces':
+                nic_rows.append(resource)
+            elif resource_type == 'microsoft.network/virtualnetworks':
+                for subnet in _get(resource, 'properties', 'subnets') or []:
+                    subnet_nsgs[_lower(subnet.get('id'))] = _lower(
+                        _get(subnet, 'properties', 'networkSecurityGroup', 'id'))
+            elif resource_type == 'microsoft.network/networksecuritygroups':
+                self.nsg_rules[_lower(resource.get('id'))] = inbound_allow_rules(resource)
+
+        for nic in nic_rows:
+            vm_id = _lower(_get(nic, 'properties', 'virtualMachine', 'id'))
+            if vm_id not in self.vms:
+                continue
+            # ARM nests the subnet under the IP configuration's properties; the
+            # query's flat path is kept as a fallback
+            ip_configuration = _get(nic, 'properties', 'ipConfigurations', 0)
+            subnet_id = _lower(_get(ip_configuration, 'properties', 'subnet', 'id')
+                               or _get(ip_configuration, 'subnet', 'id'))
+            self.nics.append(Nic(
+                _lower(nic.get('id')),
+                vm_id,
+                _lower(_get(nic, 'properties', 'networkSecurityGroup', 'id')),
+                subnet_nsgs.get(subnet_id, ''),
+            ))
+
+        self.vm_ids_by_name = {}
+        for vm_id, vm in self.vms.items():
+            self.vm_ids_by_name.setdefault(_lower(vm.get('name')), []).append(vm_id)
+        self.vm_nics = {}
+        self.nsg_nics = {}
+        for nic_index, nic in enumerate(self.nics):
+            self.vm_nics.setdefault(nic.vm_id, []).append(nic_index)
+            for nsg_id in self._attached_nsgs(nic):
+                self.nsg_nics.setdefault(nsg_id, set()).add(nic_index)
+
+        self.nsg_index = {}
+        intervals = []
+        for nsg_id, rules in self.nsg_rules.items():
+            self.nsg_index[nsg_id] = IntervalIndex((rule.start, rule.end, rule) for rule in rules)
+            intervals.extend((rule.start, rule.end, (nsg_id, rule)) for rule in rules)
+        self.index = IntervalIndex(intervals)
+
+    def _attached_nsgs(self, nic):
+        """Return the IDs of the NSGs (NIC, then subnet) attached to a NIC."""
+        return [nsg_id for nsg_id in (nic.nsg_id, nic.subnet_nsg_id) if nsg_id in self.nsg_rules]
+
+    def rows(self):
+        """Return rows with the same columns, filter and order as the query.
+
+        Like the query, every NIC rule range is paired with every subnet rule
+        range for the same NIC, and rows are ordered descending (KQL's default
+        for 'order by') on vmName, nicNsgPorts, subnetNsgPorts.
+        """
+        rows = []
+        for nic in self.nics:
+            vm = self.vms[nic.vm_id]
+            nic_rules = self.nsg_rules.get(nic.nsg_id) or [None]
+            subnet_rules = self.nsg_rules.get(nic.subnet_nsg_id) or [None]
+            for nic_rule in nic_rules:
+                for subnet_rule in subnet_rules:
+                    if nic_rule is None and subnet_rule is None:
+                        continue
+                    rows.append({
+                        'vmName': vm.get('name'),
+                        'resourceGroup': vm.get('resourceGroup'),
+                        'location': vm.get('location'),
+                        'nicNsgPorts': format_ports(nic_rule),
+                        'nicNsgProtocol': nic_rule.protocol if nic_rule else None,
+                        'nicNsgSource': nic_rule.source if nic_rule else None,
+                        'subnetNsgPorts': format_ports(subnet_rule),
+                        'subnetNsgProtocol': subnet_rule.protocol if subnet_rule else None,
+                        'subnetNsgSource': subnet_rule.source if subnet_rule else None,
+                    })
+        rows.sort(key=lambda row: (row['vmName'] or '', row['nicNsgPorts'], row['subnetNsgPorts']), reverse=True)
+        return rows
+
+    def resolve_vm(self, vm, resource_group=None):
+        """Return the VM id for a VM id, or a name optionally narrowed by resource group.
+
+        Names, like ids and resource groups, are matched case-insensitively.
+        Raises ValueError when nothing matches or a name is ambiguous.
+        """
+        if vm.startswith('/'):
+            vm_ids = [vm.lower()] if vm.lower() in self.vms else []
+        else:
+            vm_ids = [vm_id for vm_id in self.vm_ids_by_name.get(vm.lower(), [])
+                      if resource_group is None
+                      or _lower(self.vms[vm_id].get('resourceGroup')) == resource_group.lower()]
+        if not vm_ids:
+            raise ValueError(f"No VM matches '{vm}'")
+        if len(vm_ids) > 1:
+            raise ValueError(f"VM name '{vm}' is ambiguous; pass a resource group or VM id")
+        return vm_ids[0]
+
+    def vms_allowing_port(self, port, protocol=None):
+        """Return sorted (vmName, resourceGroup) of VMs with Allow rules covering a port.
+
+        A NIC qualifies when, for a single protocol, every NSG attached to it
+        (NIC and/or subnet) has an inbound Allow rule covering the port. With
+        no protocol given, Tcp and Udp are tried in turn; protocols without
+        ports never count.
+        """
+        hits = self.index.overlapping(port)
+        vm_ids = set()
+        for checked in _port_protocols(protocol):
+            allowing = {nsg_id for nsg_id, rule in hits if _protocol_matches(rule, checked)}
+            for nsg_id in allowing:
+                for nic_index in self.nsg_nics.get(nsg_id, ()):
+                    nic = self.nics[nic_index]
+                    if all(attached in allowing for attached in self._attached_nsgs(nic)):
+                        vm_ids.add(nic.vm_id)
+        return sorted((self.vms[vm_id].get('name'), self.vms[vm_id].get('resourceGroup')) for vm_id in vm_ids)
+
+    def _allowed_through(self, nsg_ids, protocol):
+        """Return the port ranges one protocol may use through every NSG in nsg_ids."""
+        ranges = [(rule.start, rule.end) for rule in self.nsg_rules[nsg_ids[0]]
+                  if _protocol_matches(rule, protocol)]
+        for nsg_id in nsg_ids[1:]:
+            clipped = []
+            for start, end in merge_ranges(ranges):
+                for rule in self.nsg_index[nsg_id].overlapping(start, end):
+                    if _protocol_matches(rule, protocol):
+                        clipped.append((max(start, rule.start), min(end, rule.end)))
+            ranges = clipped
+        return ranges
+
+    def allowed_port_ranges(self, vm, resource_group=None, protocol=None):
+        """Return the merged (start, end) port ranges a VM's Allow rules cover.
+
+        Per NIC and per protocol, the NIC NSG's ranges are clipped against the
+        subnet NSG's interval index when both are attached; the result is the
+        union over NICs and protocols. NICs without any NSG are not counted,
+        as in the query. See the class docstring for what is not evaluated.
+        """
+        ranges = []
+        for nic_index in self.vm_nics.get(self.resolve_vm(vm, resource_group), ()):
+            nsg_ids = self._attached_nsgs(self.nics[nic_index])
+            if not nsg_ids:
+                continue
+            for checked in _port_protocols(protocol):
+                ranges.extend(self._allowed_through(nsg_ids, checked))
+        return merge_ranges(ranges)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate inbound NSG allow-rule coverage of VMs from exported Resources JSON.")
+    parser.add_argument('files', nargs='+', help="Exported Resources JSON files")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--port', type=int, help="List VMs whose Allow rules cover this port")
+    group.add_argument('--vm', help="Show the port ranges covered for this VM name or id")
+    parser.add_argument('--resource-group', help="Resource group of --vm when its name is not unique")
+    parser.add_argument('--protocol', help="Only consider rules for this protocol (e.g. Tcp, Udp)")
+    parser.add_argument('--output', help="Write rows to this CSV file instead of stdout")
+    args = parser.parse_args()
+    if args.resource_group and args.vm is None:
+        parser.error("--resource-group requires --vm")
+
+    try:
+        resources = load_resources(args.files)
+    except (OSError, ValueError) as e:
+        parser.error(f"Cannot read resources: {e}")
+    exposure = NsgExposure(resources)
+
+    if args.port is not None:
+        for name, resource_group in exposure.vms_allowing_port(args.port, args.protocol):
+            print(f"{resource_group}/{name}")
+        return
+    if args.vm is not None:
+        try:
+            ranges = exposure.allowed_port_ranges(args.vm, args.resource_group, args.protocol)
+        except ValueError as e:
+            parser.error(str(e))
+        for start, end in ranges:
+            print(start if start == end else f"{start}-{end}")
+        return
+
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(out, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(exposure.rows())
+    finally:
+        if args.output:
+            out.close()
+            print(f"Exposure rows saved as '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
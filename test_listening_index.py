@@ -0,0 +1,98 @@
+import pytest
+
+from listening_index import IndexFile, ListeningIndex, parse_metadata, read_metadata_file
+
+
+def build_index():
+    index = ListeningIndex()
+    index.add_host('vm1', 'sshd:22;nginx:80;:53')
+    index.add_host('vm2', 'Memory Compression:80;sshd:22')
+    index.add_host('vm3', '')
+    return index
+
+
+def test_parse_metadata():
+    assert parse_metadata('sshd:22;:53;bad;java:99999;Memory Compression:445;') == {
+        ('sshd', 22), ('', 53), ('Memory Compression', 445)}
+
+
+def test_read_metadata_file(tmp_path):
+    path = tmp_path / 'vmbare.txt'
+    path.write_text('Memory Compression:80;sshd:22\nvm9\tjava:8080\n')
+    assert list(read_metadata_file(str(path))) == [
+        ('vmbare', 'Memory Compression:80;sshd:22'), ('vm9', 'java:8080')]
+
+
+def test_read_metadata_file_warns_on_repeated_bare_host(tmp_path, capsys):
+    path = tmp_path / 'vmbare.txt'
+    path.write_text('sshd:22\nnginx:80\n')
+    assert [host for host, _ in read_metadata_file(str(path))] == ['vmbare', 'vmbare']
+    assert "replaces earlier metadata for host 'vmbare'" in capsys.readouterr().err
+
+
+def test_incremental_update():
+    index = build_index()
+    index.add_host('vm1', 'java:8080')
+    assert index.hosts_for_port(22) == ['vm2']
+    assert index.hosts_for_process('java') == ['vm1']
+    assert index.remove_host('vm2')
+    assert not index.remove_host('vm2')
+    assert index.hosts_for_port(22) == []
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / 'index.bin')
+    index = build_index()
+    index.add_host('vm1', 'sshd:22;:53')
+    index.save(path)
+
+    loaded = ListeningIndex.load(path)
+    assert len(loaded) == 3
+    for source in (loaded, IndexFile(path)):
+        assert source.hosts_for_port(22) == ['vm1', 'vm2']
+        assert source.hosts_for_port(80) == ['vm2']
+        assert source.hosts_for_port(8080) == []
+        assert source.hosts_for_process('') == ['vm1']
+        assert source.hosts_for_process('nginx') == []
+        assert source.listeners_for_host('vm1') == [('', 53), ('sshd', 22)]
+        assert source.listeners_for_host('vm3') == []
+        assert source.listeners_for_host('missing') == []
+
+
+def test_load_rejects_corrupt_files(tmp_path):
+    path = tmp_path / 'index.bin'
+    build_index().save(str(path))
+    data = path.read_bytes()
+
+    path.write_bytes(b'XXXX' + data[4:])
+    with pytest.raises(ValueError, match='not a listening index'):
+        ListeningIndex.load(str(path))
+
+    path.write_bytes(data[:-5])
+    with pytest.raises(ValueError, match='truncated'):
+        ListeningIndex.load(str(path))
+
+    # Claim fewer strings than the posting lists reference
+    path.write_bytes(data[:8] + (1).to_bytes(4, 'little') + data[12:])
+    with pytest.raises(ValueError):
+        ListeningIndex.load(str(path))
+
+
+def test_tab_line_without_metadata_clears_host(tmp_path):
+    index = build_index()
+    path = tmp_path / 'batch2.txt'
+    path.write_text('vm1\t\n')
+    index.ingest_file(str(path))
+    assert index.listeners_for_host('vm1') == []
+    assert index.hosts_for_port(22) == ['vm2']
+    assert index.listeners_for_host('batch2') == []
+    assert len(index) == 3
+
+
+def test_empty_bare_file_clears_file_host(tmp_path):
+    index = build_index()
+    path = tmp_path / 'vm2.txt'
+    path.write_text('\n')
+    index.ingest_file(str(path))
+    assert index.listeners_for_host('vm2') == []
+    assert index.hosts_for_port(22) == ['vm1']
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from nsg_exposure import COLUMNS, IntervalIndex, NsgExposure, load_resources, parse_port_range
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'nsg_resources.json')
+
+
+@pytest.fixture(scope='module')
+def exposure():
+    return NsgExposure(load_resources([FIXTURE]))
+
+
+def test_interval_index_overlapping():
+    index = IntervalIndex([(0, 65535, 'all'), (22, 22, 'ssh'), (80, 90, 'web'), (443, 443, 'tls')])
+    assert sorted(index.overlapping(22)) == ['all', 'ssh']
+    assert sorted(index.overlapping(85, 500)) == ['all', 'tls', 'web']
+    assert IntervalIndex([]).overlapping(22) == []
+
+
+def test_rows(exposure):
+    rows = exposure.rows()
+    assert all(list(row) == COLUMNS for row in rows)
+    assert [(row['vmName'], row['nicNsgPorts'], row['subnetNsgPorts']) for row in rows] == [
+        ('web', '80-90', '0-65535'),
+        ('web', '443', '0-65535'),
+        ('web', '22', '0-65535'),
+        ('mixed', '0-65535', '22'),
+        ('app', '', '3389'),
+        ('app', '', '3389'),
+        ('PingVM', '0-65535', ''),
+    ]
+    assert sorted(row['resourceGroup'] for row in rows if row['vmName'] == 'app') == ['rg-a', 'rg-b']
+    web_ssh = rows[2]
+    assert (web_ssh['nicNsgProtocol'], web_ssh['nicNsgSource']) == ('Tcp', '10.0.0.0/8')
+    assert (web_ssh['subnetNsgProtocol'], web_ssh['subnetNsgSource']) == ('*', 'Internet')
+    assert rows[4]['nicNsgProtocol'] is None
+    assert rows[4]['subnetNsgSource'] == '10.1.0.0/16,10.2.0.0/16'
+    assert rows[6]['nicNsgProtocol'] == 'Icmp'
+
+
+def test_parse_port_range():
+    assert parse_port_range('*') == (0, 65535)
+    assert parse_port_range('90-80') == (80, 90)
+    assert parse_port_range('70000') is None
+    assert parse_port_range('-1') is None
+    assert parse_port_range('1-70000') is None
+    assert parse_port_range('http') is None
+
+
+def test_vms_allowing_port(exposure):
+    assert exposure.vms_allowing_port(22) == [('web', 'rg-a')]
+    assert exposure.vms_allowing_port(85) == [('web', 'rg-a')]
+    assert exposure.vms_allowing_port(3389) == [('app', 'rg-a'), ('app', 'rg-b')]
+    assert exposure.vms_allowing_port(3389, protocol='Udp') == []
+    assert exposure.vms_allowing_port(25) == []
+    # PingVM only allows Icmp, whose '*' port range is not port coverage
+    assert exposure.vms_allowing_port(22, protocol='Icmp') == []
+
+
+def test_allowed_port_ranges(exposure):
+    assert exposure.allowed_port_ranges('web') == [(22, 22), (80, 90), (443, 443)]
+    assert exposure.allowed_port_ranges('web', protocol='Udp') == []
+    # Tcp on the NIC NSG and Udp on the subnet NSG: no protocol gets through both
+    assert exposure.allowed_port_ranges('mixed') == []
+    assert exposure.allowed_port_ranges('bare') == []
+    assert exposure.allowed_port_ranges('pingvm') == []
+    assert exposure.allowed_port_ranges('WEB') == [(22, 22), (80, 90), (443, 443)]
+    assert exposure.allowed_port_ranges('app', resource_group='RG-B') == [(3389, 3389)]
+    vm_id = '/subscriptions/00000000-0000-0000-0000-000000000000/resourceGroups/rg-a/providers/Microsoft.Compute/virtualMachines/app'
+    assert exposure.allowed_port_ranges(vm_id) == [(3389, 3389)]
+
+
+def test_allowed_port_ranges_rejects_unknown_or_ambiguous_vm(exposure):
+    with pytest.raises(ValueError, match='ambiguous'):
+        exposure.allowed_port_ranges('app')
+    with pytest.raises(ValueError, match='No VM'):
+        exposure.allowed_port_ranges('missing')
+
+
+def test_load_resources_rejects_non_resource_json(tmp_path):
+    path = tmp_path / 'resources.json'
+    path.write_text('{"data": "oops"}')
+    with pytest.raises(ValueError):
+        load_resources([str(path)])